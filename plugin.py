@@ -5,11 +5,30 @@ RegexFilter 正则过滤插件
 """
 
 import re
-from typing import List, Tuple, Type, Optional, Dict, Any
+import copy
+import atexit
+import asyncio
+import functools
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Tuple, Type, Optional, Dict, Any, Iterator
 import json
 import logging
 import os
-import toml
+import queue
+import stat
+import tempfile
+import threading
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    import tomli as tomllib
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
 
 from src.plugin_system import (
     BasePlugin,
@@ -29,139 +48,1242 @@ from src.config.config import CONFIG_DIR
 logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=256)
+def _compile(pattern: str, flags: int = 0) -> re.Pattern:
+    """编译正则表达式并缓存，避免每条消息重复编译"""
+    return re.compile(pattern, flags)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_re2():
+    """首次编译规则时才导入 google-re2（线性时间匹配，不存在灾难性回溯），未安装时返回None"""
+    try:
+        import re2
+    except ImportError:
+        return None
+    options = re2.Options()
+    options.log_errors = False  # 不支持的语法会回退到re，无需在stderr输出错误
+    return re2, options
+
+
+@functools.lru_cache(maxsize=None)
+def _load_ahocorasick():
+    """字面量很多时才导入 pyahocorasick，未安装时返回None"""
+    try:
+        import ahocorasick
+    except ImportError:
+        return None
+    return ahocorasick
+
+
+@functools.lru_cache(maxsize=None)
+def _load_regex():
+    """需要匹配超时时才导入第三方 regex 模块，未安装时返回None"""
+    try:
+        import regex
+    except ImportError:
+        return None
+    return regex
+
+
+class _TimeoutMatcher:
+    """regex 模块编译的正则，每次匹配都带超时，超时抛出 TimeoutError；接口与编译后的正则一致
+
+    regex 的错误类型不是 re.error 的子类，这里统一转换为 re.error，调用方无需区分引擎。
+    """
+
+    __slots__ = ("_compiled", "_error", "pattern", "_timeout")
+
+    def __init__(self, compiled, error: Type[Exception], timeout: float):
+        self._compiled = compiled
+        self._error = error
+        self.pattern = compiled.pattern
+        self._timeout = timeout
+
+    def subn(self, replacement, content: str) -> Tuple[str, int]:
+        try:
+            return self._compiled.subn(replacement, content, timeout=self._timeout)
+        except self._error as e:
+            raise re.error(str(e)) from e
+
+    def sub(self, replacement, content: str) -> str:
+        return self.subn(replacement, content)[0]
+
+
+def _backtracking_matcher(pattern: str, flags: int = 0, timeout: float = 0.0):
+    """编译由回溯引擎执行的正则：设置了超时且安装了 regex 模块时使用带超时的 regex，否则使用re"""
+    compiled = _compile(pattern, flags)
+    regex = _load_regex() if timeout > 0 else None
+    if regex is not None:
+        try:
+            # 使用 regex 的默认 VERSION0（与re兼容的语义），标志位数值与re相同
+            return _TimeoutMatcher(regex.compile(pattern, flags), regex.error, timeout)
+        except regex.error:
+            pass
+    return compiled
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_matcher(pattern: str, flags: int = 0, use_re2: bool = True, timeout: float = 0.0):
+    """编译用于处理消息的正则：与re语义一致时优先使用RE2引擎，否则回退到回溯引擎"""
+    engine = _load_re2() if use_re2 else None
+    if engine is not None and _re2_compatible(_parse_pattern(pattern, flags)):
+        re2, options = engine
+        inline_flags = ("i" if flags & re.IGNORECASE else "") + ("m" if flags & re.MULTILINE else "")
+        try:
+            return re2.compile(f"(?{inline_flags}){pattern}" if inline_flags else pattern, options)
+        except re2.error:
+            pass
+    return _backtracking_matcher(pattern, flags, timeout)
+
+
+def _compile_replace(
+    pattern: str, replacement: str, flags: int = 0, use_re2: bool = True, timeout: float = 0.0
+) -> Tuple[Any, Any]:
+    """编译替换规则，返回 (匹配器, 替换内容)
+
+    google-re2 展开含非ASCII字符的替换模板时会得到乱码：不含分组引用的改用返回常量的回调，
+    含分组引用的回退到re执行。
+    """
+    matcher = _compile_matcher(pattern, flags, use_re2, timeout)
+    if isinstance(matcher, (re.Pattern, _TimeoutMatcher)) or replacement.isascii():
+        return matcher, replacement
+    if "\\" in replacement:
+        return _backtracking_matcher(pattern, flags, timeout), replacement
+    return matcher, lambda match: replacement
+
+
+class _LiteralMatcher:
+    """纯字面量规则的匹配器，用 str.replace 代替正则引擎，接口与编译后的正则一致"""
+
+    __slots__ = ("pattern",)
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+
+    def subn(self, replacement: str, content: str) -> Tuple[str, int]:
+        count = content.count(self.pattern)
+        return (content.replace(self.pattern, replacement) if count else content), count
+
+    def sub(self, replacement: str, content: str) -> str:
+        return content.replace(self.pattern, replacement)
+
+
+class _AhoCorasickMatcher:
+    """大量纯字面量删除规则的匹配器：Aho-Corasick 自动机一次扫描找出所有词，
+    与前缀树正则一样从左到右、在每个位置取最长的词，接口与编译后的正则一致（只用于删除）
+
+    不使用 iter_long：它在较长的词匹配失败时会漏掉其中包含的较短的词。
+    """
+
+    __slots__ = ("_automaton", "pattern")
+
+    def __init__(self, automaton, pattern: str):
+        self._automaton = automaton
+        self.pattern = pattern
+
+    def subn(self, replacement: str, content: str) -> Tuple[str, int]:
+        # 按 (起点, 长度降序) 排序后贪心选取互不重叠的匹配
+        matches = sorted((end - length + 1, -length) for end, length in self._automaton.iter(content))
+        parts = []
+        position = 0
+        for start, negative_length in matches:
+            if start >= position:
+                parts.append(content[position:start])
+                position = start - negative_length
+        if not parts:
+            return content, 0
+        parts.append(content[position:])
+        return replacement.join(parts), len(parts) - 1
+
+    def sub(self, replacement: str, content: str) -> str:
+        return self.subn(replacement, content)[0]
+
+
+def _engine_allows_re2(config: Dict[str, Any]) -> bool:
+    """advanced.regex_engine 为 "re" 时强制使用Python re，"auto" 在可用时使用RE2"""
+    return _config_value(config, "advanced", "regex_engine") != "re"
+
+
+def _flatten_schema(schema: Dict[str, Dict[str, Any]]) -> Dict[Tuple[str, str], Tuple[type, Any, Any]]:
+    """把 config_schema 展开为 {(节, 键): (类型, 默认值, 可选值)}，只包含标量配置项"""
+    return {
+        (section, key): (config_field.type, config_field.default, config_field.choices)
+        for section, fields in schema.items()
+        for key, config_field in fields.items()
+        if config_field.type is not list
+    }
+
+
+def _config_value(config: Dict[str, Any], section: str, key: str) -> Any:
+    """按展开后的 config_schema 读取标量配置项，缺失或类型、取值不合法时使用默认值"""
+    expected_type, default, choices = _SCHEMA_FIELDS[(section, key)]
+    value = config.get(section, {}).get(key, default)
+    # 浮点配置项也接受整数写法；bool 是 int 的子类，需要单独排除
+    if expected_type is float and isinstance(value, int) and not isinstance(value, bool):
+        value = float(value)
+    if not isinstance(value, expected_type) or (expected_type is int and isinstance(value, bool)):
+        logger.warning(f"配置项 {section}.{key} 类型错误: {value!r}，使用默认值 {default!r}")
+        return default
+    if choices and value not in choices:
+        logger.warning(f"配置项 {section}.{key} 取值无效: {value!r}，可选值 {choices}，使用默认值 {default!r}")
+        return default
+    return value
+
+
+def _rule_flags(rule: Dict[str, Any]) -> int:
+    """根据规则配置计算正则标志位"""
+    flags = 0
+    if rule.get("ignore_case", False):
+        flags |= re.IGNORECASE
+    if rule.get("multiline", False):
+        flags |= re.MULTILINE
+    return flags
+
+
+def _parse_pattern(pattern: str, flags: int = 0) -> Optional["sre_parse.SubPattern"]:
+    """解析正则表达式语法树，解析失败时返回None"""
+    try:
+        return sre_parse.parse(pattern, flags)
+    except re.error:
+        return None
+
+
+def _iter_ops(items) -> Iterator[Tuple[Any, Any]]:
+    """递归遍历语法树中的所有 (操作码, 参数)"""
+    for op, av in items:
+        yield op, av
+        yield from _iter_nested_ops(av)
+
+
+def _iter_nested_ops(av) -> Iterator[Tuple[Any, Any]]:
+    if isinstance(av, sre_parse.SubPattern):
+        yield from _iter_ops(av)
+    elif isinstance(av, (tuple, list)):
+        for item in av:
+            yield from _iter_nested_ops(item)
+
+
+# RE2中 \d \s \w \b 只匹配ASCII，与re在str上的Unicode语义不同
+_CATEGORY_COMPLEMENTS = {
+    sre_parse.CATEGORY_DIGIT: sre_parse.CATEGORY_NOT_DIGIT,
+    sre_parse.CATEGORY_NOT_DIGIT: sre_parse.CATEGORY_DIGIT,
+    sre_parse.CATEGORY_SPACE: sre_parse.CATEGORY_NOT_SPACE,
+    sre_parse.CATEGORY_NOT_SPACE: sre_parse.CATEGORY_SPACE,
+    sre_parse.CATEGORY_WORD: sre_parse.CATEGORY_NOT_WORD,
+    sre_parse.CATEGORY_NOT_WORD: sre_parse.CATEGORY_WORD,
+}
+
+
+def _re2_compatible(parsed: Optional["sre_parse.SubPattern"]) -> bool:
+    """判断表达式交给RE2执行时匹配结果是否与re一致"""
+    if parsed is None:
+        return False
+    # re 在空匹配之后还会在同一位置尝试非空匹配，RE2 的 subn 则直接跳到下一个位置，
+    # 多行模式下 ^ $ 处的空匹配还会被重复替换，因此可能匹配空串的表达式都交给re执行
+    # （如 c?|a 对 "xa"：re 得到 "x"，RE2 得到 "xa"）
+    if parsed.getwidth()[0] == 0:
+        return False
+    multiline = parsed.state.flags & re.MULTILINE
+    for op, av in _iter_ops(parsed):
+        if op is sre_parse.AT:
+            if av in (sre_parse.AT_BOUNDARY, sre_parse.AT_NON_BOUNDARY):
+                return False
+            # re 的 $ 还能匹配末尾换行符之前的位置，RE2 不能
+            if av is sre_parse.AT_END and not multiline:
+                return False
+        elif op is sre_parse.IN:
+            categories = {value for item_op, value in av if item_op is sre_parse.CATEGORY}
+            # 像 [\s\S] 这样同时包含互补类别时匹配任意字符，两者语义一致
+            if categories and not any(_CATEGORY_COMPLEMENTS[c] in categories for c in categories):
+                return False
+        elif op is sre_parse.CATEGORY:
+            return False
+    return True
+
+
+def _required_literal(parsed: Optional["sre_parse.SubPattern"]) -> Optional[str]:
+    """提取任何匹配都必须包含的最长字面量，用于在执行正则前快速跳过不可能匹配的规则"""
+    if parsed is None or parsed.state.flags & re.IGNORECASE:
+        return None
+
+    best = current = ""
+    for op, av in parsed:
+        if op is sre_parse.LITERAL:
+            current += chr(av)
+            if len(current) > len(best):
+                best = current
+        else:
+            current = ""
+    return best or None
+
+
+def _can_batch(compiled: re.Pattern, parsed: Optional["sre_parse.SubPattern"], flags: int) -> bool:
+    """判断规则能否安全地合并进交替表达式：无内联全局标志、无命名分组、无反向引用"""
+    if parsed is None or compiled.groupindex:
+        return False
+    if compiled.flags != _compile("", flags).flags:
+        return False
+    return not any(
+        op is sre_parse.GROUPREF or op is sre_parse.GROUPREF_EXISTS
+        for op, _ in _iter_ops(parsed)
+    )
+
+
+# 互不相交的字符类别组合，其余组合视为可能匹配相同字符
+_DISJOINT_CATEGORIES = {
+    frozenset(pair)
+    for pair in (
+        (sre_parse.CATEGORY_DIGIT, sre_parse.CATEGORY_NOT_DIGIT),
+        (sre_parse.CATEGORY_SPACE, sre_parse.CATEGORY_NOT_SPACE),
+        (sre_parse.CATEGORY_WORD, sre_parse.CATEGORY_NOT_WORD),
+        (sre_parse.CATEGORY_DIGIT, sre_parse.CATEGORY_SPACE),
+        (sre_parse.CATEGORY_WORD, sre_parse.CATEGORY_SPACE),
+        (sre_parse.CATEGORY_DIGIT, sre_parse.CATEGORY_NOT_WORD),
+    )
+}
+
+_CATEGORY_PATTERNS = {
+    sre_parse.CATEGORY_DIGIT: r"\d",
+    sre_parse.CATEGORY_NOT_DIGIT: r"\D",
+    sre_parse.CATEGORY_SPACE: r"\s",
+    sre_parse.CATEGORY_NOT_SPACE: r"\S",
+    sre_parse.CATEGORY_WORD: r"\w",
+    sre_parse.CATEGORY_NOT_WORD: r"\W",
+}
+
+_REPEAT_OPS = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT)
+
+
+def _char_classes(items, ignorecase: bool) -> Optional[set]:
+    """收集可能匹配到的字符和字符类别（\\d \\s \\w 等），含任意字符或取反时返回None"""
+    classes = set()
+    for op, av in _iter_ops(items):
+        if op is sre_parse.LITERAL:
+            classes.add(chr(av))
+        elif op is sre_parse.CATEGORY:
+            classes.add(av)
+        elif op is sre_parse.IN:
+            for item_op, item_av in av:
+                if item_op is sre_parse.LITERAL:
+                    classes.add(chr(item_av))
+                elif item_op is sre_parse.CATEGORY:
+                    classes.add(item_av)
+                elif item_op is sre_parse.RANGE and item_av[1] - item_av[0] < 256:
+                    classes.update(chr(code) for code in range(item_av[0], item_av[1] + 1))
+                else:
+                    return None
+        elif op in (sre_parse.NOT_LITERAL, sre_parse.ANY, sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS):
+            return None
+    if ignorecase:
+        classes |= {case for item in classes if isinstance(item, str) for case in (item.lower(), item.upper())}
+    return classes
+
+
+def _classes_overlap(first: Optional[set], second: Optional[set]) -> bool:
+    """两组字符/类别是否可能匹配同一个字符，未知（None）时视为重叠"""
+    if first is None or second is None or not first.isdisjoint(second):
+        return True
+    for a in first:
+        for b in second:
+            if isinstance(a, str) and isinstance(b, str):
+                continue
+            if isinstance(a, str):
+                a, b = b, a
+            if isinstance(b, str):
+                if re.match(_CATEGORY_PATTERNS[a], b):
+                    return True
+            elif frozenset((a, b)) not in _DISJOINT_CATEGORIES:
+                return True
+    return False
+
+
+def _first_classes(items, ignorecase: bool) -> Tuple[Optional[set], bool]:
+    """返回序列首个字符可能的字符/类别（未知时为None），以及序列能否匹配空串"""
+    first = set()
+    for op, av in items:
+        if op in _REPEAT_OPS:
+            classes, nullable = _first_classes(av[2], ignorecase)
+            nullable = nullable or av[0] == 0
+        elif op is sre_parse.SUBPATTERN:
+            classes, nullable = _first_classes(av[-1], ignorecase)
+        elif op is sre_parse.BRANCH:
+            branches = [_first_classes(alt, ignorecase) for alt in av[1]]
+            classes = None if any(c is None for c, _ in branches) else set().union(*(c for c, _ in branches))
+            nullable = any(n for _, n in branches)
+        elif op in (sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            continue  # 零宽断言不消耗字符
+        elif op in (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS):
+            return None, True
+        else:
+            classes, nullable = _char_classes([(op, av)], ignorecase), False
+        if classes is None:
+            return None, nullable
+        first |= classes
+        if not nullable:
+            return first, False
+    return first, True
+
+
+def _variable_length(items, ignorecase: bool) -> bool:
+    """序列是否包含长度可变的部分：上下限不同的重复，或含可为空分支的分支（(a|aa) 会被解析为 a(?:|a)）"""
+    for op, av in items:
+        if op in _REPEAT_OPS:
+            if av[0] != av[1] or _variable_length(av[2], ignorecase):
+                return True
+        elif op is sre_parse.SUBPATTERN:
+            if _variable_length(av[-1], ignorecase):
+                return True
+        elif op is sre_parse.BRANCH:
+            if any(_first_classes(alt, ignorecase)[1] or _variable_length(alt, ignorecase) for alt in av[1]):
+                return True
+    return False
+
+
+def _body_elements(items, ignorecase: bool) -> List[Tuple[Optional[set], bool, bool]]:
+    """把重复体展开为依次匹配的元素 (可能匹配的字符/类别, 能否为空, 长度是否可变)，分组展开为其内容，零宽断言略过"""
+    elements = []
+    for op, av in items:
+        if op is sre_parse.SUBPATTERN:
+            elements.extend(_body_elements(av[-1], ignorecase))
+        elif op not in (sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            item = [(op, av)]
+            elements.append(
+                (_char_classes(item, ignorecase), _first_classes(item, ignorecase)[1], _variable_length(item, ignorecase))
+            )
+    return elements
+
+
+def _ambiguous_elements(items, ignorecase: bool) -> bool:
+    """重复体中长度可变的元素与紧随其后（跨越到下一次迭代）、直到第一个不能为空的元素为止的各元素
+    是否可能匹配相同字符，如 (a+)+、(a+a)+；(\\S+\\s+)* 中相邻元素互不相交则安全"""
+    elements = _body_elements(items, ignorecase)
+    for index, (classes, _, variable) in enumerate(elements):
+        if not variable:
+            continue
+        for offset in range(1, len(elements) + 1):
+            other, nullable, _ = elements[(index + offset) % len(elements)]
+            if _classes_overlap(classes, other):
+                return True
+            if not nullable:
+                break
+    return False
+
+
+def _ambiguous_branch(items, ignorecase: bool) -> bool:
+    """是否存在首字符可能相同（或都能匹配空串）的分支，如 (a|a)、(\\d|\\w\\w)"""
+    for op, av in _iter_ops(items):
+        if op is sre_parse.BRANCH:
+            firsts = [_first_classes(alt, ignorecase) for alt in av[1]]
+            for index, (first, nullable) in enumerate(firsts):
+                for other, other_nullable in firsts[index + 1:]:
+                    if (nullable and other_nullable) or _classes_overlap(first, other):
+                        return True
+    return False
+
+
+def _has_nested_quantifier(parsed: Optional["sre_parse.SubPattern"]) -> bool:
+    """检测会导致灾难性回溯的结构，即外层无上限重复的重复体可以用多种方式切分同一段文本：
+    - 长度可变的元素与其后相邻的元素可能匹配相同字符，如 (a+)+、(\\w+\\s?)*、(a+|b)+、(a|aa)+
+    - 重复体内的分支首字符可能相同，如 (a|a)*、(\\d|\\w\\w)+
+    """
+    if parsed is None:
+        return False
+    ignorecase = bool(parsed.state.flags & re.IGNORECASE)
+    for op, av in _iter_ops(parsed):
+        if op in _REPEAT_OPS and av[1] == sre_parse.MAXREPEAT:
+            if _ambiguous_elements(av[2], ignorecase) or _ambiguous_branch(av[2], ignorecase):
+                return True
+    return False
+
+
+def _literal_text(parsed: Optional["sre_parse.SubPattern"]) -> Optional[str]:
+    """如果表达式只由字面量组成（不含任何元字符），返回对应的文本"""
+    if not parsed or any(op is not sre_parse.LITERAL for op, _ in parsed):
+        return None
+    return "".join(chr(av) for _, av in parsed)
+
+
+def _pattern_chars(parsed: Optional["sre_parse.SubPattern"]) -> Optional[set]:
+    """收集表达式可能匹配到的全部字符，含任意字符、取反或类别时返回None"""
+    if parsed is None:
+        return None
+    chars = set()
+    for op, av in _iter_ops(parsed):
+        if op is sre_parse.LITERAL:
+            chars.add(chr(av))
+        elif op is sre_parse.IN:
+            for item_op, item_av in av:
+                if item_op is sre_parse.LITERAL:
+                    chars.add(chr(item_av))
+                elif item_op is sre_parse.RANGE and item_av[1] - item_av[0] < 256:
+                    chars.update(chr(code) for code in range(item_av[0], item_av[1] + 1))
+                else:
+                    return None
+        elif op in (sre_parse.NOT_LITERAL, sre_parse.ANY, sre_parse.CATEGORY):
+            return None
+    if parsed.state.flags & re.IGNORECASE:
+        chars |= {case for char in chars for case in (char.lower(), char.upper())}
+    return chars
+
+
+def _single_char_set(parsed: Optional["sre_parse.SubPattern"]) -> Tuple[str, ...]:
+    """表达式只匹配单个字符且可枚举（单个字面量或只含字面量/小范围的字符类）时返回这些字符"""
+    if parsed is None or len(parsed) != 1 or parsed.state.flags & re.IGNORECASE:
+        return ()
+    op, av = parsed[0]
+    if op is not sre_parse.LITERAL and op is not sre_parse.IN:
+        return ()
+    chars = _pattern_chars(parsed)
+    return tuple(sorted(chars)) if chars else ()
+
+
+def _trie_regex(words: List[str]) -> str:
+    """把一组字面量构建为前缀树形式的正则，共享前缀只需匹配一次，同一位置优先匹配最长的词"""
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}  # 词尾标记
+    return _trie_node_regex(trie)
+
+
+def _trie_node_regex(node: Dict[str, dict]) -> str:
+    alternatives = []
+    single_chars = []
+    for char in sorted(key for key in node if key):
+        rest = _trie_node_regex(node[char])
+        if rest:
+            alternatives.append(re.escape(char) + rest)
+        else:
+            single_chars.append(re.escape(char))
+    if single_chars:
+        alternatives.append(single_chars[0] if len(single_chars) == 1 else "[" + "".join(single_chars) + "]")
+
+    if not alternatives:
+        return ""
+    body = alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+    if "" in node:
+        return "(?:" + body + ")?"
+    return body
+
+
+# 合并的纯字面量达到该数量时改用 Aho-Corasick 自动机（需安装 pyahocorasick）
+_AHOCORASICK_MIN_WORDS = 200
+
+
+def _union_rule(
+    items: List[Tuple[str, Tuple[str, ...], Tuple[str, ...]]], flags: int, use_re2: bool = True, timeout: float = 0.0
+) -> Tuple[Any, Tuple[str, ...]]:
+    """把多条 (pattern, 必需字面量, 等价的字面量集合) 合并为一个交替表达式，只需扫描一次内容
+
+    纯字面量和单字符集合的规则会合并成一个前缀树分支（单字符折叠为一个字符类），
+    放在第一条此类规则的位置。
+    """
+    hints = tuple(dict.fromkeys(hint for _, item_hints, _ in items for hint in item_hints))
+    if not all(item_hints for _, item_hints, _ in items):
+        hints = ()
+    if len(items) == 1:
+        item_words = items[0][2]
+        if len(item_words) == 1 and not flags & re.IGNORECASE:
+            return _LiteralMatcher(item_words[0]), hints
+        return _compile_matcher(items[0][0], flags, use_re2, timeout), hints
+
+    alternatives: List[str] = []
+    words: List[str] = []
+    trie_index = None
+    for pattern, _, item_words in items:
+        if item_words:
+            if trie_index is None:
+                trie_index = len(alternatives)
+                alternatives.append("")
+            words.extend(item_words)
+        else:
+            alternatives.append(pattern)
+    if trie_index is not None:
+        alternatives[trie_index] = _trie_regex(words)
+
+    # 全部是字面量且数量很多时，Aho-Corasick 自动机比巨大的前缀树正则更快
+    if len(alternatives) == 1 and len(words) >= _AHOCORASICK_MIN_WORDS and not flags & re.IGNORECASE:
+        ahocorasick = _load_ahocorasick()
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for word in words:
+                automaton.add_word(word, len(word))
+            automaton.make_automaton()
+            return _AhoCorasickMatcher(automaton, alternatives[0]), hints
+
+    if len(alternatives) == 1:
+        return _compile_matcher(alternatives[0], flags, use_re2, timeout), hints
+    union = "|".join(f"(?:{alternative})" for alternative in alternatives)
+    return _compile_matcher(union, flags, use_re2, timeout), hints
+
+
+def _explain_rule(
+    items: List[Tuple[int, str, Tuple[str, ...]]], flags: int
+) -> Optional[Tuple[str, int, Tuple[int, ...]]]:
+    """为合并执行的多条 (配置规则下标, pattern, 等价的字面量集合) 生成 /regex_test 用的等价表达式
+
+    每条规则（纯字面量规则则是每个词）包在命名分组 _r{序号} 中，字面量按最长优先排列在第一条此类规则的位置，
+    与前缀树/Aho-Corasick 的匹配结果一致。返回 (表达式, 标志位, 各分组对应的配置规则下标)，单条规则返回None。
+    """
+    if len(items) <= 1:
+        return None
+    alternatives: List[str] = []
+    members: List[int] = []
+    words: Dict[str, int] = {}
+    trie_index = None
+    for index, pattern, item_words in items:
+        if item_words:
+            if trie_index is None:
+                trie_index = len(alternatives)
+                alternatives.append("")
+            for word in item_words:
+                words.setdefault(word, index)
+        else:
+            alternatives.append(f"(?P<_r{len(members)}>{pattern})")
+            members.append(index)
+    if trie_index is not None:
+        groups = []
+        for word in sorted(words, key=len, reverse=True):
+            groups.append(f"(?P<_r{len(members)}>{re.escape(word)})")
+            members.append(words[word])
+        alternatives[trie_index] = "|".join(groups)
+    return "|".join(alternatives), flags, tuple(members)
+
+
+def _matched_sources(
+    explain: Optional[Tuple[str, int, Tuple[int, ...]]], sources: Tuple[int, ...], content: str
+) -> List[int]:
+    """返回执行项中实际命中内容的配置规则下标，合并执行的规则按命中的分组区分"""
+    if explain is None:
+        return list(sources)
+    pattern, flags, members = explain
+    hit = {members[int(match.lastgroup[2:])] for match in _compile(pattern, flags).finditer(content)}
+    return [index for index in sources if index in hit]
+
+
+def _fusible_chars(
+    compiled: re.Pattern, parsed: Optional["sre_parse.SubPattern"], flags: int, replacement: str
+) -> Optional[set]:
+    """替换规则可以与其他规则合并时返回它可能匹配的字符，否则返回None
+
+    只有每次匹配至少消耗一个字符、不含零宽断言和局部标志分组（如 (?i:a)）、可能匹配的字符可枚举，
+    且替换文本非空、不含转义的规则才能合并；纯字面量规则单独用 str.replace 执行更快，不参与合并。
+    """
+    if not replacement or "\\" in replacement or _literal_text(parsed) is not None:
+        return None
+    if not _can_batch(compiled, parsed, flags) or parsed.getwidth()[0] == 0:
+        return None
+    for op, av in _iter_ops(parsed):
+        if op in (sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            return None
+        # _pattern_chars 只按全局标志展开大小写，局部标志分组可能匹配到未收集的字符
+        if op is sre_parse.SUBPATTERN and (av[1] or av[2]):
+            return None
+    return _pattern_chars(parsed)
+
+
+def _fused_replace_rule(
+    items: List[Tuple[str, str, Optional[str]]], flags: int, use_re2: bool = True, timeout: float = 0.0
+) -> Tuple[Any, Any, Tuple[str, ...]]:
+    """把多条 (pattern, 替换文本, 必需字面量) 合并为一个带命名分组的交替表达式，按命中的分组选择替换文本"""
+    literals = tuple(literal for _, _, literal in items)
+    hints = tuple(dict.fromkeys(literals)) if all(literals) else ()
+    if len(items) == 1:
+        matcher, replacement = _compile_replace(items[0][0], items[0][1], flags, use_re2, timeout)
+        return matcher, replacement, hints
+
+    union = "|".join(f"(?P<_r{index}>{pattern})" for index, (pattern, _, _) in enumerate(items))
+    replacements = {f"_r{index}": replacement for index, (_, replacement, _) in enumerate(items)}
+    return _compile_matcher(union, flags, use_re2, timeout), lambda match: replacements[match.lastgroup], hints
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledRuleset:
+    """预编译的规则集 - 只包含已启用的规则，消息处理时直接遍历
+
+    规则在这里只保留 (匹配器, 替换内容, 必需字面量) 元组，不含配置字典；
+    enabled、description 等元数据只在管理命令中按需从配置读取。
+    """
+
+    enabled: bool = True
+    # 每条规则附带必需字面量（为空表示无法提取），内容中不含任何一个时跳过规则；
+    # 相邻、标志位相同且互相独立的正则替换规则会合并为一个按命名分组分派替换文本的表达式
+    replace: Tuple[Tuple[Any, Any, Tuple[str, ...]], ...] = ()
+    # 开启 merge_delete_rules 时，相邻且标志位相同的删除规则会合并为一个交替表达式，其中纯字面量规则合并为前缀树
+    delete: Tuple[Tuple[Any, Tuple[str, ...]], ...] = ()
+    # 添加规则预先拼接好的前缀和后缀
+    prefix: str = ""
+    suffix: str = ""
+    log_changes: bool = False
+    # 最大处理长度（<=0 表示不限制）及超出时的处理方式: "head" 只处理开头部分 / "skip" 跳过整条消息
+    max_content_length: int = 0
+    truncation_mode: str = "head"
+    # 所有替换/删除规则中最短的可能匹配长度，内容比它短时不可能命中任何规则
+    min_match_length: int = 0
+    # 每个执行项对应的配置规则下标，以及自规则集构建以来的命中次数（与 replace/delete 一一对应，
+    # 合并执行的多条规则只有一个计数）；规则按配置顺序依次执行、结果依赖顺序，因此只统计不重排
+    replace_sources: Tuple[Tuple[int, ...], ...] = ()
+    delete_sources: Tuple[Tuple[int, ...], ...] = ()
+    # 合并执行项的等价表达式（见 _explain_rule，单条规则为None），/regex_test 用来区分实际命中的规则
+    replace_explain: Tuple[Optional[Tuple[str, int, Tuple[int, ...]]], ...] = ()
+    delete_explain: Tuple[Optional[Tuple[str, int, Tuple[int, ...]]], ...] = ()
+    replace_hits: List[int] = field(default_factory=list, compare=False, repr=False)
+    delete_hits: List[int] = field(default_factory=list, compare=False, repr=False)
+    # 编译失败而被跳过的规则 (pattern, 错误信息)，构建时记录一次，/regex_test 直接展示
+    invalid: Tuple[Tuple[str, str], ...] = ()
+    # 短消息的处理结果缓存 {原始内容: (处理后内容, 是否变化)}，随规则集重建自动失效；
+    # 命中缓存的消息不再执行规则，也不重复计入命中次数
+    results: "OrderedDict[str, Tuple[str, bool]]" = field(default_factory=OrderedDict, compare=False, repr=False)
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "CompiledRuleset":
+        """从配置字典构建规则集，过滤禁用规则并预先计算标志位"""
+        rules_config = config.get("rules", {})
+        use_re2 = _engine_allows_re2(config)
+        timeout = _config_value(config, "advanced", "regex_timeout")
+
+        min_lengths: List[int] = []
+        invalid: List[Tuple[str, str]] = []
+        replace = []
+        replace_sources: List[Tuple[int, ...]] = []
+        replace_explain: List[Optional[Tuple[str, int, Tuple[int, ...]]]] = []
+        fused: List[Tuple[str, str, Optional[str]]] = []
+        fused_indices: List[int] = []
+        fused_flags = 0
+        fused_chars: set = set()
+        for index, rule in enumerate(rules_config.get("replace_rules", [])):
+            if not rule.get("enabled", True):
+                continue
+            pattern = rule.get("pattern", "")
+            replacement = rule.get("replacement", "")
+            flags = _rule_flags(rule)
+            try:
+                compiled = _compile(pattern, flags)
+            except re.error as e:
+                logger.warning(f"正则表达式错误: {pattern} - {e}")
+                invalid.append((pattern, str(e)))
+                continue
+            parsed = _parse_pattern(pattern, flags)
+            literal = _required_literal(parsed)
+            min_lengths.append(parsed.getwidth()[0] if parsed is not None else 0)
+
+            # 只合并互相独立的规则，保证一次扫描与依次替换的结果相同：本规则可能匹配的字符
+            # 与前面规则可能匹配的字符、前面规则的替换文本都不相交，既不会重叠匹配也不会连锁匹配
+            chars = _fusible_chars(compiled, parsed, flags, replacement)
+            if fused and (chars is None or flags != fused_flags or not chars.isdisjoint(fused_chars)):
+                replace.append(_fused_replace_rule(fused, fused_flags, use_re2, timeout))
+                replace_sources.append(tuple(fused_indices))
+                replace_explain.append(
+                    _explain_rule([(i, p, ()) for i, (p, _, _) in zip(fused_indices, fused)], fused_flags)
+                )
+                fused, fused_indices, fused_chars = [], [], set()
+            if chars is not None:
+                fused.append((pattern, replacement, literal))
+                fused_indices.append(index)
+                fused_flags = flags
+                fused_chars |= chars | set(replacement)
+            elif "\\" not in replacement and not parsed.state.flags & re.IGNORECASE and _literal_text(parsed):
+                # 纯字面量且替换文本不含转义时直接用 str.replace（包括 (?i) 等内联标志在内都不能忽略大小写）
+                replace.append((_LiteralMatcher(_literal_text(parsed)), replacement, (literal,) if literal else ()))
+                replace_sources.append((index,))
+                replace_explain.append(None)
+            else:
+                matcher, repl = _compile_replace(pattern, replacement, flags, use_re2, timeout)
+                replace.append((matcher, repl, (literal,) if literal else ()))
+                replace_sources.append((index,))
+                replace_explain.append(None)
+        if fused:
+            replace.append(_fused_replace_rule(fused, fused_flags, use_re2, timeout))
+            replace_sources.append(tuple(fused_indices))
+            replace_explain.append(
+                _explain_rule([(i, p, ()) for i, (p, _, _) in zip(fused_indices, fused)], fused_flags)
+            )
+
+        delete = []
+        delete_sources: List[Tuple[int, ...]] = []
+        delete_explain: List[Optional[Tuple[str, int, Tuple[int, ...]]]] = []
+        # 合并扫描与依次删除的结果可能不同（见 README），只在 advanced.merge_delete_rules 开启时合并，
+        # 否则每条规则单独成批，纯字面量规则仍走 str.replace
+        merge_deletes = _config_value(config, "advanced", "merge_delete_rules")
+        batch: List[Tuple[str, Tuple[str, ...], Tuple[str, ...]]] = []
+        batch_indices: List[int] = []
+        batch_flags = 0
+        for index, rule in enumerate(rules_config.get("delete_rules", [])):
+            if not rule.get("enabled", True):
+                continue
+            pattern = rule.get("pattern", "")
+            flags = _rule_flags(rule)
+            try:
+                compiled = _compile(pattern, flags)
+            except re.error as e:
+                logger.warning(f"正则表达式错误: {pattern} - {e}")
+                invalid.append((pattern, str(e)))
+                continue
+            parsed = _parse_pattern(pattern, flags)
+            literal = _required_literal(parsed)
+            min_lengths.append(parsed.getwidth()[0] if parsed is not None else 0)
+
+            if batch and (not merge_deletes or flags != batch_flags or not _can_batch(compiled, parsed, flags)):
+                delete.append(_union_rule(batch, batch_flags, use_re2, timeout))
+                delete_sources.append(tuple(batch_indices))
+                delete_explain.append(
+                    _explain_rule([(i, p, words) for i, (p, _, words) in zip(batch_indices, batch)], batch_flags)
+                )
+                batch, batch_indices = [], []
+            if _can_batch(compiled, parsed, flags):
+                # 字面量及少量单字符集合可作为前置字面量检查，单字符集合也并入前缀树的字符类
+                text = _literal_text(parsed)
+                chars = () if text else _single_char_set(parsed)
+                hints = (literal,) if literal else chars if len(chars) <= 8 else ()
+                batch.append((pattern, hints, (text,) if text else chars))
+                batch_indices.append(index)
+                batch_flags = flags
+            else:
+                delete.append((_compile_matcher(pattern, flags, use_re2, timeout), (literal,) if literal else ()))
+                delete_sources.append((index,))
+                delete_explain.append(None)
+        if batch:
+            delete.append(_union_rule(batch, batch_flags, use_re2, timeout))
+            delete_sources.append(tuple(batch_indices))
+            delete_explain.append(
+                _explain_rule([(i, p, words) for i, (p, _, words) in zip(batch_indices, batch)], batch_flags)
+            )
+
+        # 前缀规则依次加在最前面，后添加的排在更前，因此需要倒序拼接
+        append_rules = [rule for rule in rules_config.get("append_rules", []) if rule.get("enabled", True)]
+        prefix = "".join(
+            rule.get("content", "") for rule in reversed(append_rules) if rule.get("position", "end") == "start"
+        )
+        suffix = "".join(
+            rule.get("content", "") for rule in append_rules if rule.get("position", "end") != "start"
+        )
+
+        return cls(
+            enabled=_config_value(config, "plugin", "enabled"),
+            replace=tuple(replace),
+            delete=tuple(delete),
+            prefix=prefix,
+            suffix=suffix,
+            log_changes=_config_value(config, "advanced", "log_changes"),
+            max_content_length=_config_value(config, "advanced", "max_content_length"),
+            truncation_mode=_config_value(config, "advanced", "truncation_mode"),
+            min_match_length=min(min_lengths, default=0),
+            replace_sources=tuple(replace_sources),
+            delete_sources=tuple(delete_sources),
+            replace_explain=tuple(replace_explain),
+            delete_explain=tuple(delete_explain),
+            replace_hits=[0] * len(replace),
+            delete_hits=[0] * len(delete),
+            invalid=tuple(invalid),
+        )
+
+    def rule_hits(self, rule_type: str) -> Dict[int, int]:
+        """返回 {配置规则下标: 命中次数}
+
+        合并执行的规则只有整体的计数，无法区分由哪条规则命中，因此不包含在结果中。
+        """
+        if rule_type == "replace":
+            sources, hits = self.replace_sources, self.replace_hits
+        else:
+            sources, hits = self.delete_sources, self.delete_hits
+        return {indices[0]: count for indices, count in zip(sources, hits) if len(indices) == 1}
+
+
+# TOML基本字符串需要转义的字符
+_TOML_ESCAPE = str.maketrans({
+    '\\': '\\\\',
+    '"': '\\"',
+    '\n': '\\n',
+    '\r': '\\r',
+    '\t': '\\t',
+})
+_TOML_ESCAPE_CHARS = '\\"\n\r\t'
+
+
+# 配置修改后延迟写入磁盘的时间（秒），期间的多次修改合并为一次写入
+_FLUSH_DELAY = 0.2
+
+
 class ConfigManager:
     """配置管理器 - 负责读写配置文件"""
+
+    # 已解析配置缓存: config_path -> (文件状态, 配置字典)
+    _cache: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+    # 已编译规则集缓存: config_path -> (文件状态, ruleset)
+    _ruleset_cache: Dict[str, Tuple[Optional[Tuple[int, int]], CompiledRuleset]] = {}
     
     def __init__(self, plugin_name: str, config_file_name: str):
         self.plugin_name = plugin_name
         self.config_file_name = config_file_name
         self.config_path = os.path.join(CONFIG_DIR, "plugins", plugin_name, config_file_name)
+        # 尚未写入磁盘的配置及其规则集，以及延迟写入的定时器
+        self._pending: Optional[Dict[str, Any]] = None
+        self._pending_ruleset: Optional[CompiledRuleset] = None
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # 后台预热线程与消息处理可能同时编译规则集，加锁保证只编译一次
+        self._ruleset_lock = threading.Lock()
+
+        # 确保配置目录存在，只需在初始化时创建一次
+        try:
+            os.makedirs(os.path.dirname(self.config_path), exist_ok=True)
+        except OSError as e:
+            logger.error(f"创建配置目录失败: {e}")
+
+    def _file_state(self) -> Optional[Tuple[int, int]]:
+        """获取配置文件的 (修改时间ns, 大小)，文件不存在时返回None"""
+        try:
+            st = os.stat(self.config_path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _load_cached(self, state: Optional[Tuple[int, int]]) -> Dict[str, Any]:
+        """读取解析后的配置，文件未修改时直接返回缓存（调用方不得修改返回值）"""
+        if state is None:
+            return {}
+
+        cached = self._cache.get(self.config_path)
+        if cached is not None and cached[0] == state:
+            return cached[1]
+
+        with open(self.config_path, 'rb') as f:
+            config = tomllib.load(f)
+        self._cache[self.config_path] = (state, config)
+        return config
         
     def load_config(self) -> Dict[str, Any]:
-        """加载配置文件"""
+        """加载配置文件，返回副本，调用方可以自由修改"""
+        # 有尚未写入磁盘的修改时以内存中的为准
+        if self._pending is not None:
+            return copy.deepcopy(self._pending)
         try:
-            if os.path.exists(self.config_path):
-                with open(self.config_path, 'r', encoding='utf-8') as f:
-                    return toml.load(f)
+            return copy.deepcopy(self._load_cached(self._file_state()))
+        except Exception as e:
+            logger.error(f"加载配置文件失败: {e}")
             return {}
+
+    def view_config(self) -> Dict[str, Any]:
+        """返回缓存中的配置本身（不复制），只供读取，调用方不得修改"""
+        if self._pending is not None:
+            return self._pending
+        try:
+            return self._load_cached(self._file_state())
         except Exception as e:
             logger.error(f"加载配置文件失败: {e}")
             return {}
     
+    def load_ruleset(self) -> CompiledRuleset:
+        """加载已编译的规则集，配置文件未修改时直接返回缓存"""
+        if self._pending is not None:
+            if self._pending_ruleset is None:
+                self._pending_ruleset = CompiledRuleset.from_config(self._pending)
+            return self._pending_ruleset
+
+        try:
+            state = self._file_state()
+        except OSError:
+            state = None
+
+        cached = self._ruleset_cache.get(self.config_path)
+        if cached is not None and cached[0] == state:
+            return cached[1]
+
+        with self._ruleset_lock:
+            # 等待锁期间其他线程可能已经编译完成
+            cached = self._ruleset_cache.get(self.config_path)
+            if cached is not None and cached[0] == state:
+                return cached[1]
+            try:
+                config = self._load_cached(state)
+            except Exception as e:
+                logger.error(f"加载配置文件失败: {e}")
+                config = {}
+            ruleset = CompiledRuleset.from_config(config)
+            self._ruleset_cache[self.config_path] = (state, ruleset)
+            return ruleset
+
+    def warm_up(self) -> None:
+        """在后台线程中预编译规则集，插件加载无需等待所有规则编译完成"""
+        # 不在导入时单独预编译 config_schema 中的默认规则：消息处理实际执行的是RE2、str.replace、
+        # 合并后的表达式等匹配器，只预热 re.compile 的缓存没有用处，反而增加每次导入的开销
+        threading.Thread(target=self.load_ruleset, name=f"{self.plugin_name}-warmup", daemon=True).start()
+    
     def save_config(self, config_data: Dict[str, Any]) -> bool:
-        """保存配置文件"""
+        """保存配置：先更新内存中的配置，短暂延迟后合并写入磁盘
+
+        连续执行多条命令时只写一次文件；没有运行中的事件循环时立即写入。
+        """
+        self._pending = config_data
+        self._pending_ruleset = None
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return self.flush_now()
+
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        self._flush_handle = loop.call_later(_FLUSH_DELAY, self.flush_now)
+        return True
+
+    def flush_now(self) -> bool:
+        """立即把尚未写入的配置保存到磁盘"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._pending is None:
+            return True
+
+        config_data = self._pending
         try:
-            # 确保目录存在
-            os.makedirs(os.path.dirname(self.config_path), exist_ok=True)
-            
             # 生成TOML内容
             toml_content = self._generate_toml_content(config_data)
-            
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                f.write(toml_content)
-            
-            logger.info(f"配置文件已保存: {self.config_path}")
-            return True
+            self._write_atomic(toml_content.encode('utf-8'))
         except Exception as e:
             logger.error(f"保存配置文件失败: {e}")
             return False
+
+        # 写入的内容就是内存中的配置，直接作为新文件状态的缓存，无需重新解析
+        state = self._file_state()
+        self._cache[self.config_path] = (state, config_data)
+        self._ruleset_cache[self.config_path] = (
+            state, self._pending_ruleset or CompiledRuleset.from_config(config_data)
+        )
+        self._pending = None
+        self._pending_ruleset = None
+
+        logger.info(f"配置文件已保存: {self.config_path}")
+        return True
+    
+    def _write_atomic(self, data: bytes):
+        """先写入同目录下的临时文件再替换，进程中途退出也不会留下写了一半的配置文件"""
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(self.config_path), prefix=".config.", suffix=".toml.tmp"
+        )
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            # mkstemp 创建的文件仅所有者可读写，沿用原文件的权限
+            try:
+                mode = stat.S_IMODE(os.stat(self.config_path).st_mode)
+            except FileNotFoundError:
+                mode = 0o644
+            os.chmod(tmp_path, mode)
+            os.replace(tmp_path, self.config_path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
     
     def _escape_toml_string(self, value: str) -> str:
         """转义TOML字符串中的特殊字符"""
-        # 转义双引号和反斜杠
-        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r').replace('\t', '\\t')
+        # 不含需要转义的字符时直接返回，避免分配新字符串
+        if not any(c in value for c in _TOML_ESCAPE_CHARS):
+            return value
+        # 一次扫描完成双引号、反斜杠和控制字符的转义
+        return value.translate(_TOML_ESCAPE)
 
     def _generate_toml_content(self, config_data: Dict[str, Any]) -> str:
         """生成带注释的TOML内容"""
         try:
-            toml_str = f"# {self.plugin_name} - 自动生成的配置文件\n"
-            toml_str += "# 一个使用正则表达式处理LLM消息的MaiBot插件，可以对LLM回复进行替换、删除、增添等操作。\n\n"
+            parts: List[str] = [
+                f"# {self.plugin_name} - 自动生成的配置文件\n",
+                "# 一个使用正则表达式处理LLM消息的MaiBot插件，可以对LLM回复进行替换、删除、增添等操作。\n\n",
+            ]
             
             # 插件基本配置
             if 'plugin' in config_data:
-                toml_str += "# 插件基本配置\n[plugin]\n\n"
+                parts.append("# 插件基本配置\n[plugin]\n\n")
                 plugin_config = config_data['plugin']
                 
                 if 'enabled' in plugin_config:
-                    toml_str += "# 是否启用插件\n"
-                    toml_str += f"enabled = {str(plugin_config['enabled']).lower()}\n\n"
+                    parts.append("# 是否启用插件\n")
+                    parts.append(f"enabled = {str(plugin_config['enabled']).lower()}\n\n")
                 
                 if 'config_version' in plugin_config:
-                    toml_str += "# 配置文件版本\n"
+                    parts.append("# 配置文件版本\n")
                     version = self._escape_toml_string(str(plugin_config["config_version"]))
-                    toml_str += f'config_version = "{version}"\n\n'
+                    parts.append(f'config_version = "{version}"\n\n')
             
             # 正则过滤规则配置
             if 'rules' in config_data:
-                toml_str += "\n# 正则过滤规则配置\n[rules]\n\n"
+                parts.append("\n# 正则过滤规则配置\n[rules]\n\n")
                 rules_config = config_data['rules']
                 
                 # 替换规则列表
                 if 'replace_rules' in rules_config:
-                    toml_str += "# 替换规则列表\n"
+                    parts.append("# 替换规则列表\n")
                     for rule in rules_config['replace_rules']:
-                        toml_str += "[[rules.replace_rules]]\n"
+                        parts.append("[[rules.replace_rules]]\n")
                         pattern = self._escape_toml_string(rule.get("pattern", ""))
                         replacement = self._escape_toml_string(rule.get("replacement", ""))
-                        toml_str += f'pattern = "{pattern}"\n'
-                        toml_str += f'replacement = "{replacement}"\n'
-                        toml_str += f'enabled = {str(rule.get("enabled", True)).lower()}\n'
-                        toml_str += f'ignore_case = {str(rule.get("ignore_case", False)).lower()}\n'
-                        toml_str += f'multiline = {str(rule.get("multiline", False)).lower()}\n'
+                        parts.append(f'pattern = "{pattern}"\n')
+                        parts.append(f'replacement = "{replacement}"\n')
+                        parts.append(f'enabled = {str(rule.get("enabled", True)).lower()}\n')
+                        parts.append(f'ignore_case = {str(rule.get("ignore_case", False)).lower()}\n')
+                        parts.append(f'multiline = {str(rule.get("multiline", False)).lower()}\n')
                         if 'description' in rule:
                             desc = self._escape_toml_string(rule["description"])
-                            toml_str += f'description = "{desc}"\n'
-                        toml_str += "\n"
+                            parts.append(f'description = "{desc}"\n')
+                        parts.append("\n")
                 
                 # 删除规则列表
                 if 'delete_rules' in rules_config:
-                    toml_str += "# 删除规则列表\n"
+                    parts.append("# 删除规则列表\n")
                     for rule in rules_config['delete_rules']:
-                        toml_str += "[[rules.delete_rules]]\n"
+                        parts.append("[[rules.delete_rules]]\n")
                         pattern = self._escape_toml_string(rule.get("pattern", ""))
-                        toml_str += f'pattern = "{pattern}"\n'
-                        toml_str += f'enabled = {str(rule.get("enabled", True)).lower()}\n'
-                        toml_str += f'ignore_case = {str(rule.get("ignore_case", False)).lower()}\n'
-                        toml_str += f'multiline = {str(rule.get("multiline", False)).lower()}\n'
+                        parts.append(f'pattern = "{pattern}"\n')
+                        parts.append(f'enabled = {str(rule.get("enabled", True)).lower()}\n')
+                        parts.append(f'ignore_case = {str(rule.get("ignore_case", False)).lower()}\n')
+                        parts.append(f'multiline = {str(rule.get("multiline", False)).lower()}\n')
                         if 'description' in rule:
                             desc = self._escape_toml_string(rule["description"])
-                            toml_str += f'description = "{desc}"\n'
-                        toml_str += "\n"
+                            parts.append(f'description = "{desc}"\n')
+                        parts.append("\n")
                 
                 # 添加规则列表
                 if 'append_rules' in rules_config:
-                    toml_str += "# 添加规则列表\n"
+                    parts.append("# 添加规则列表\n")
                     for rule in rules_config['append_rules']:
-                        toml_str += "[[rules.append_rules]]\n"
+                        parts.append("[[rules.append_rules]]\n")
                         content = self._escape_toml_string(rule.get("content", ""))
                         position = self._escape_toml_string(rule.get("position", "end"))
-                        toml_str += f'content = "{content}"\n'
-                        toml_str += f'position = "{position}"\n'
-                        toml_str += f'enabled = {str(rule.get("enabled", True)).lower()}\n'
+                        parts.append(f'content = "{content}"\n')
+                        parts.append(f'position = "{position}"\n')
+                        parts.append(f'enabled = {str(rule.get("enabled", True)).lower()}\n')
                         if 'description' in rule:
                             desc = self._escape_toml_string(rule["description"])
-                            toml_str += f'description = "{desc}"\n'
-                        toml_str += "\n"
+                            parts.append(f'description = "{desc}"\n')
+                        parts.append("\n")
             
             # 高级设置
             if 'advanced' in config_data:
-                toml_str += "# 高级设置\n[advanced]\n\n"
+                parts.append("# 高级设置\n[advanced]\n\n")
                 advanced_config = config_data['advanced']
                 
                 if 'max_content_length' in advanced_config:
-                    toml_str += "# 最大处理内容长度\n"
-                    toml_str += f"max_content_length = {advanced_config['max_content_length']}\n\n"
+                    parts.append("# 最大处理内容长度\n")
+                    parts.append(f"max_content_length = {advanced_config['max_content_length']}\n\n")
+                
+                if 'truncation_mode' in advanced_config:
+                    parts.append("# 内容超过最大长度时的处理方式: head 只处理前 max_content_length 个字符 / skip 跳过整条消息\n")
+                    mode = self._escape_toml_string(str(advanced_config["truncation_mode"]))
+                    parts.append(f'truncation_mode = "{mode}"\n\n')
+                
+                if 'regex_engine' in advanced_config:
+                    parts.append("# 正则引擎: auto 安装了google-re2时对兼容的规则使用RE2 / re 始终使用Python re\n")
+                    engine = self._escape_toml_string(str(advanced_config["regex_engine"]))
+                    parts.append(f'regex_engine = "{engine}"\n\n')
+                
+                if 'regex_timeout' in advanced_config:
+                    parts.append("# 单条规则的匹配超时（秒），需安装regex模块，仅对不使用RE2的规则生效，0 表示不限制\n")
+                    parts.append(f"regex_timeout = {advanced_config['regex_timeout']}\n\n")
                 
                 if 'log_changes' in advanced_config:
-                    toml_str += "# 是否记录更改日志\n"
-                    toml_str += f"log_changes = {str(advanced_config['log_changes']).lower()}\n"
+                    parts.append("# 是否记录更改日志\n")
+                    parts.append(f"log_changes = {str(advanced_config['log_changes']).lower()}\n")
             
-            return toml_str
+            return "".join(parts)
         except Exception as e:
             logger.error(f"生成TOML内容时出错: {e}")
             raise
 
 
+# 全局共享的配置管理器，缓存随之在各组件间复用
+_CONFIG_MANAGER = ConfigManager("regex_filter_plugin", "config.toml")
+# 退出前写入尚未保存的修改
+atexit.register(_CONFIG_MANAGER.flush_now)
+
+
+# 处理结果日志的分隔线
+_LOG_RULE = "=" * 80
+_LOG_SEPARATOR = "-" * 80
+
+# 待输出的更改日志 (原始内容, 处理后内容, 是否记录详细更改)，由后台线程输出，消息处理不等待日志I/O；
+# 队列有上限，日志输出卡住时丢弃新的记录并计数，避免内容副本无限堆积
+_CHANGE_LOG_QUEUE_SIZE = 1000
+_CHANGE_LOG_QUEUE: "queue.Queue[Tuple[str, str, bool]]" = queue.Queue(maxsize=_CHANGE_LOG_QUEUE_SIZE)
+_CHANGE_LOG_DROPPED = 0
+_CHANGE_LOG_LOCK = threading.Lock()
+
+
+def _enqueue_change_log(original_content: str, cleaned_content: str, log_changes: bool) -> None:
+    """把更改日志交给后台线程，队列已满时只记录丢弃的条数"""
+    global _CHANGE_LOG_DROPPED
+    try:
+        _CHANGE_LOG_QUEUE.put_nowait((original_content, cleaned_content, log_changes))
+    except queue.Full:
+        with _CHANGE_LOG_LOCK:
+            _CHANGE_LOG_DROPPED += 1
+
+
+def _log_change(original_content: str, cleaned_content: str, log_changes: bool) -> None:
+    """记录完整的原始内容和处理后的内容，合并为一条日志"""
+    logger.info(
+        "%s\nRegexFilter处理结果:\n原始内容长度: %d\n处理后长度: %d\n原始内容:\n%s\n%s\n处理后内容:\n%s\n%s",
+        _LOG_RULE, len(original_content), len(cleaned_content),
+        original_content, _LOG_SEPARATOR, cleaned_content, _LOG_RULE,
+    )
+    # 根据配置决定是否记录详细更改日志
+    if log_changes:
+        logger.info("消息已处理: '%s...' -> '%s...'", original_content[:100], cleaned_content[:100])
+    else:
+        logger.info("消息已处理，长度从 %d 变为 %d", len(original_content), len(cleaned_content))
+
+
+def _report_dropped_change_logs() -> None:
+    global _CHANGE_LOG_DROPPED
+    with _CHANGE_LOG_LOCK:
+        dropped, _CHANGE_LOG_DROPPED = _CHANGE_LOG_DROPPED, 0
+    if dropped:
+        logger.warning(f"更改日志队列已满，丢弃了 {dropped} 条更改日志")
+
+
+def _drain_change_log() -> None:
+    while True:
+        _log_change(*_CHANGE_LOG_QUEUE.get())
+        _report_dropped_change_logs()
+
+
+@functools.lru_cache(maxsize=None)
+def _start_change_logger() -> None:
+    """第一次有消息被修改时启动日志线程，退出前同步输出队列中剩余的日志"""
+    threading.Thread(target=_drain_change_log, name="regex_filter_plugin-changelog", daemon=True).start()
+    atexit.register(_flush_change_log)
+
+
+def _flush_change_log() -> None:
+    while True:
+        try:
+            record = _CHANGE_LOG_QUEUE.get_nowait()
+        except queue.Empty:
+            _report_dropped_change_logs()
+            return
+        _log_change(*record)
+
+
+# 缓存处理结果的短消息最大长度，以及每个规则集最多缓存的消息条数
+_RESULT_CACHE_MAX_LENGTH = 64
+_RESULT_CACHE_SIZE = 1024
+
+# 空白清理正则，依次匹配：段落分隔（含前后空格）、单个换行（含前后空格）、连续空格/制表符
+_WHITESPACE_RE = re.compile(r'[ \t]*\n\s*\n\s*|[ \t]*\n[ \t]*|[ \t]+')
+
+
+def _whitespace_repl(match: re.Match) -> str:
+    """根据匹配到的换行数量决定替换内容"""
+    newlines = match.group().count('\n')
+    if newlines > 1:
+        return '\n\n'
+    return '\n' if newlines else ' '
+
+
 class RegexMessageFilter(BaseEventHandler):
     """消息正则过滤处理器，拦截LLM响应并进行处理"""
 
@@ -179,28 +1301,108 @@ class RegexMessageFilter(BaseEventHandler):
         # 去除开头和结尾的空白字符
         content = content.strip()
         
-        # 将连续的空白字符（包括换行、空格、制表符）替换为合理的格式
-        # 保留段落间的双换行，但清理多余的空白
-        content = re.sub(r'\n\s*\n\s*', '\n\n', content)  # 保留段落分隔
-        content = re.sub(r'[ \t]+', ' ', content)  # 多个空格/制表符合并为一个空格
-        content = re.sub(r'\n[ \t]+', '\n', content)  # 行首的空格清理
-        content = re.sub(r'[ \t]+\n', '\n', content)  # 行尾的空格清理
+        # 没有换行、制表符和连续空格时无需正则处理
+        if '\n' not in content and '\t' not in content and '  ' not in content:
+            return content
+        
+        # 一次扫描完成：保留段落分隔、合并空格/制表符、清理行首行尾空格
+        content = _WHITESPACE_RE.sub(_whitespace_repl, content)
         
         return content.strip()
 
+    def _process_cached(self, content: str, ruleset: CompiledRuleset) -> Tuple[str, bool]:
+        """短消息先查结果缓存，群聊中反复出现的相同短回复无需再次执行规则"""
+        if len(content) > _RESULT_CACHE_MAX_LENGTH:
+            return self._process_sync(content, ruleset)
+
+        cache = ruleset.results
+        cached = cache.get(content)
+        if cached is not None:
+            cache.move_to_end(content)
+            return cached
+
+        result = self._process_sync(content, ruleset)
+        cache[content] = result
+        if len(cache) > _RESULT_CACHE_SIZE:
+            cache.popitem(last=False)
+        return result
+
+    def _process_sync(self, content: str, ruleset: CompiledRuleset) -> Tuple[str, bool]:
+        """对内容应用规则集（纯CPU计算），返回 (处理后内容, 是否发生变化)"""
+        # 刻意保持在str上处理：中文回复在str中每字2字节、UTF-8中3字节，
+        # 且bytes模式下 . \s 和忽略大小写的语义不同，还可能切断多字节字符
+        processed_content = content
+
+        # 超过最大处理长度时只对开头部分应用规则，剩余部分原样拼接回去
+        tail = ""
+        max_length = ruleset.max_content_length
+        if max_length > 0 and len(content) > max_length:
+            processed_content, tail = content[:max_length], content[max_length:]
+
+        # 根据 subn 的替换次数判断是否有规则实际修改了内容，未匹配时保留原字符串
+        dirty = False
+
+        # 内容比最短的可能匹配还短时，任何规则都不会命中
+        if len(processed_content) < ruleset.min_match_length:
+            replace_rules = delete_rules = ()
+        else:
+            replace_rules, delete_rules = ruleset.replace, ruleset.delete
+
+        # 应用替换规则
+        for position, (pattern, replacement, literals) in enumerate(replace_rules):
+            if literals and not any(literal in processed_content for literal in literals):
+                continue
+            try:
+                new_content, count = pattern.subn(replacement, processed_content)
+            except (re.error, IndexError) as e:  # RE2 对无效分组引用抛出 IndexError
+                logger.warning(f"替换内容错误: {pattern.pattern} - {e}")
+                continue
+            except TimeoutError:
+                logger.warning(f"正则匹配超时，本条消息跳过该规则: {pattern.pattern}")
+                continue
+            if count:
+                dirty = True
+                processed_content = new_content
+                ruleset.replace_hits[position] += 1
+
+        # 应用删除规则
+        for position, (pattern, literals) in enumerate(delete_rules):
+            if literals and not any(literal in processed_content for literal in literals):
+                continue
+            try:
+                new_content, count = pattern.subn("", processed_content)
+            except TimeoutError:
+                logger.warning(f"正则匹配超时，本条消息跳过该规则: {pattern.pattern}")
+                continue
+            if count:
+                dirty = True
+                processed_content = new_content
+                ruleset.delete_hits[position] += 1
+
+        # 没有任何规则生效时直接返回，不做清理和比较
+        if not dirty and not (ruleset.prefix or ruleset.suffix):
+            return content, False
+
+        # 应用添加规则
+        processed_content = ruleset.prefix + processed_content + tail + ruleset.suffix
+
+        # 最终清理：去除多余的空格和换行
+        cleaned_content = self._clean_extra_whitespace(processed_content)
+        return cleaned_content, cleaned_content != content
+
     async def execute(self, params: dict | None) -> HandlerResult:
         """执行消息过滤处理"""
         try:
-            logger.info(f"RegexFilter开始处理消息，参数类型: {type(params)}")
+            logger.info("RegexFilter开始处理消息，参数类型: %s", type(params))
             if params:
-                logger.info(f"参数键值: {list(params.keys())}")
+                logger.info("参数键值: %s", params.keys())
             
-            # 直接使用ConfigManager加载配置并检查插件是否启用
-            config_manager = ConfigManager("regex_filter_plugin", "config.toml")
-            config = config_manager.load_config()
+            # 加载已编译的规则集并检查插件是否启用
+            config_manager = _CONFIG_MANAGER
+            ruleset = config_manager.load_ruleset()
             
-            plugin_enabled = config.get("plugin", {}).get("enabled", True)
-            logger.info(f"插件启用状态: {plugin_enabled}")
+            plugin_enabled = ruleset.enabled
+            logger.info("插件启用状态: %s", plugin_enabled)
             if not plugin_enabled:
                 logger.info("插件未启用，跳过处理")
                 return HandlerResult(success=True, continue_process=True, message="插件未启用", handler_name=self.handler_name)
@@ -213,100 +1415,34 @@ class RegexMessageFilter(BaseEventHandler):
             # 获取LLM响应内容
             llm_response = params.get("llm_response")
             if not llm_response:
-                logger.warning(f"未找到llm_response，可用参数: {list(params.keys()) if params else 'None'}")
+                logger.warning("未找到llm_response，可用参数: %s", params.keys())
                 return HandlerResult(success=True, continue_process=True, message="未找到llm_response", handler_name=self.handler_name)
             
             original_content = llm_response.get("content")
             if not original_content:
                 logger.warning("llm_response中没有content字段")
                 return HandlerResult(success=True, continue_process=True, message="未找到LLM响应内容", handler_name=self.handler_name)
-                
-            logger.info("成功获取到LLM响应内容")
 
-            processed_content = original_content
-            logger.info(f"开始处理内容，原始长度: {len(original_content)}")
-
-            # 应用替换规则
-            replace_rules = config.get("rules", {}).get("replace_rules", [])
-            for rule in replace_rules:
-                if not rule.get("enabled", True):
-                    continue
-                
-                pattern = rule.get("pattern", "")
-                replacement = rule.get("replacement", "")
-                flags = 0
-                
-                if rule.get("ignore_case", False):
-                    flags |= re.IGNORECASE
-                if rule.get("multiline", False):
-                    flags |= re.MULTILINE
-                
-                try:
-                    processed_content = re.sub(pattern, replacement, processed_content, flags=flags)
-                except re.error as e:
-                    logger.warning(f"正则表达式错误: {pattern} - {e}")
-
-            # 应用删除规则
-            delete_rules = config.get("rules", {}).get("delete_rules", [])
-            for rule in delete_rules:
-                if not rule.get("enabled", True):
-                    continue
-                
-                pattern = rule.get("pattern", "")
-                flags = 0
+            max_length = ruleset.max_content_length
+            if ruleset.truncation_mode == "skip" and 0 < max_length < len(original_content):
+                logger.warning("内容长度 %d 超过最大处理长度 %d，跳过处理", len(original_content), max_length)
+                return HandlerResult(success=True, continue_process=True, message="内容超过最大处理长度", handler_name=self.handler_name)
                 
-                if rule.get("ignore_case", False):
-                    flags |= re.IGNORECASE
-                if rule.get("multiline", False):
-                    flags |= re.MULTILINE
-                
-                try:
-                    processed_content = re.sub(pattern, "", processed_content, flags=flags)
-                except re.error as e:
-                    logger.warning(f"正则表达式错误: {pattern} - {e}")
-
-            # 应用添加规则
-            append_rules = config.get("rules", {}).get("append_rules", [])
-            for rule in append_rules:
-                if not rule.get("enabled", True):
-                    continue
-                
-                position = rule.get("position", "end")  # "start" or "end"
-                content = rule.get("content", "")
-                
-                if position == "start":
-                    processed_content = content + processed_content
-                else:  # end
-                    processed_content = processed_content + content
+            logger.info("成功获取到LLM响应内容")
 
-            # 最终清理：去除多余的空格和换行
-            cleaned_content = self._clean_extra_whitespace(processed_content)
+            logger.info("开始处理内容，原始长度: %d", len(original_content))
+            cleaned_content, changed = self._process_cached(original_content, ruleset)
             
             # 如果内容发生变化，更新LLM响应内容
-            if cleaned_content != original_content:
+            if changed:
                 # 更新llm_response中的content
                 llm_response["content"] = cleaned_content
                 logger.info("已更新llm_response['content']")
                 
-                # 根据配置决定是否记录详细更改日志
-                log_changes = config.get("advanced", {}).get("log_changes", False)
-                
-                # 总是记录完整的原始内容和处理后的内容
-                logger.info("=" * 80)
-                logger.info("RegexFilter处理结果:")
-                logger.info(f"原始内容长度: {len(original_content)}")
-                logger.info(f"处理后长度: {len(cleaned_content)}")
-                logger.info("原始内容:")
-                logger.info(original_content)
-                logger.info("-" * 80)
-                logger.info("处理后内容:")
-                logger.info(cleaned_content)
-                logger.info("=" * 80)
-                
-                if log_changes:
-                    logger.info(f"消息已处理: '{original_content[:100]}...' -> '{cleaned_content[:100]}...'")
-                else:
-                    logger.info(f"消息已处理，长度从 {len(original_content)} 变为 {len(cleaned_content)}")
+                # 更改日志交给后台线程格式化并输出，日志级别不够时完全跳过
+                if logger.isEnabledFor(logging.INFO):
+                    _start_change_logger()
+                    _enqueue_change_log(original_content, cleaned_content, ruleset.log_changes)
                     
                 return HandlerResult(success=True, continue_process=True, message="消息处理完成", handler_name=self.handler_name)
             else:
@@ -337,14 +1473,19 @@ class RegexListCommand(PlusCommand):
                     await self.send_text("❌ 未知子命令，使用 /regex list 查看规则列表")
                     return False, "未知子命令", True
             
-            # 直接使用ConfigManager加载配置
-            config_manager = ConfigManager("regex_filter_plugin", "config.toml")
-            config = config_manager.load_config()
+            # 使用共享的ConfigManager读取配置（只读，无需复制）
+            config_manager = _CONFIG_MANAGER
+            config = config_manager.view_config()
             
             replace_rules = config.get("rules", {}).get("replace_rules", [])
             delete_rules = config.get("rules", {}).get("delete_rules", [])
             append_rules = config.get("rules", {}).get("append_rules", [])
             
+            # 自配置上次变更以来各规则的命中次数
+            ruleset = config_manager.load_ruleset()
+            replace_hits = ruleset.rule_hits("replace")
+            delete_hits = ruleset.rule_hits("delete")
+            
             plugin_enabled = config.get("plugin", {}).get("enabled", True)
             status = "🟢 启用" if plugin_enabled else "🔴 禁用"
             
@@ -357,7 +1498,8 @@ class RegexListCommand(PlusCommand):
                     enabled = "✅" if rule.get("enabled", True) else "❌"
                     pattern = rule.get("pattern", "")
                     replacement = rule.get("replacement", "")
-                    message += f"{i}. {enabled} '{pattern}' -> '{replacement}'\n"
+                    hits = f" (命中 {replace_hits[i - 1]} 次)" if replace_hits.get(i - 1) else ""
+                    message += f"{i}. {enabled} '{pattern}' -> '{replacement}'{hits}\n"
                 message += "\n"
             
             # 删除规则
@@ -366,7 +1508,8 @@ class RegexListCommand(PlusCommand):
                 for i, rule in enumerate(delete_rules, 1):
                     enabled = "✅" if rule.get("enabled", True) else "❌"
                     pattern = rule.get("pattern", "")
-                    message += f"{i}. {enabled} 删除 '{pattern}'\n"
+                    hits = f" (命中 {delete_hits[i - 1]} 次)" if delete_hits.get(i - 1) else ""
+                    message += f"{i}. {enabled} 删除 '{pattern}'{hits}\n"
                 message += "\n"
             
             # 添加规则
@@ -448,19 +1591,39 @@ class RegexAddCommand(PlusCommand):
 
                 # 验证正则表达式
                 try:
-                    re.compile(pattern)
+                    _compile(pattern)
                 except re.error as e:
                     await self.send_text(f"❌ 无效的正则表达式: {e}")
                     return False, f"无效的正则表达式: {e}", True
 
+                # 会由re执行的表达式需要检查灾难性回溯，RE2为线性时间匹配无此风险；
+                # 按实际执行的匹配器判断，含分组引用的非ASCII替换内容也会回退到re
+                use_re2 = _engine_allows_re2(_CONFIG_MANAGER.view_config())
+                if replacement is not None:
+                    matcher = _compile_replace(pattern, replacement, 0, use_re2)[0]
+                else:
+                    matcher = _compile_matcher(pattern, 0, use_re2)
+                backtracking = isinstance(matcher, (re.Pattern, _TimeoutMatcher))
+                if backtracking and _has_nested_quantifier(_parse_pattern(pattern)):
+                    await self.send_text(
+                        "❌ 该表达式的重复部分可以用多种方式匹配同一段文本（如 (a+)+、(a|a)*），可能导致灾难性回溯而卡住消息处理\n"
+                        "请改写表达式，或使用原子组 (?>...) / 占有量词 *+ ++（Python 3.11+）"
+                    )
+                    return False, "表达式存在灾难性回溯风险", True
+
+                # RE2可用但不支持该表达式时提示用户，规则仍会由re执行
+                engine_note = ""
+                if use_re2 and _load_re2() is not None and backtracking:
+                    engine_note = "\n⚠️ 该规则无法使用RE2引擎（如反向引用、环视、Unicode类别或含分组引用的非ASCII替换内容），将使用Python re执行"
+
                 if replacement is not None:
                     # 添加替换规则
                     await self._add_replace_rule(pattern, replacement)
-                    await self.send_text(f"✅ 成功添加替换规则:\n'{pattern}' -> '{replacement}'")
+                    await self.send_text(f"✅ 成功添加替换规则:\n'{pattern}' -> '{replacement}'{engine_note}")
                 else:
                     # 添加删除规则
                     await self._add_delete_rule(pattern)
-                    await self.send_text(f"✅ 成功添加删除规则:\n删除 '{pattern}'")
+                    await self.send_text(f"✅ 成功添加删除规则:\n删除 '{pattern}'{engine_note}")
 
                 return True, "添加规则成功", True
 
@@ -471,7 +1634,7 @@ class RegexAddCommand(PlusCommand):
 
     async def _add_replace_rule(self, pattern: str, replacement: str):
         """添加替换规则到配置"""
-        config_manager = ConfigManager("regex_filter_plugin", "config.toml")
+        config_manager = _CONFIG_MANAGER
         config = config_manager.load_config()
         
         # 确保rules节存在
@@ -500,7 +1663,7 @@ class RegexAddCommand(PlusCommand):
 
     async def _add_delete_rule(self, pattern: str):
         """添加删除规则到配置"""
-        config_manager = ConfigManager("regex_filter_plugin", "config.toml")
+        config_manager = _CONFIG_MANAGER
         config = config_manager.load_config()
         
         # 确保rules节存在
@@ -528,7 +1691,7 @@ class RegexAddCommand(PlusCommand):
 
     async def _add_append_rule(self, content: str, position: str):
         """添加附加规则到配置"""
-        config_manager = ConfigManager("regex_filter_plugin", "config.toml")
+        config_manager = _CONFIG_MANAGER
         config = config_manager.load_config()
         
         # 确保rules节存在
@@ -601,7 +1764,7 @@ class RegexRemoveCommand(PlusCommand):
 
     async def _delete_rule(self, rule_type: str, index: int) -> bool:
         """删除指定类型和索引的规则"""
-        config_manager = ConfigManager("regex_filter_plugin", "config.toml")
+        config_manager = _CONFIG_MANAGER
         config = config_manager.load_config()
         
         rule_key = f"{rule_type}_rules"
@@ -638,11 +1801,9 @@ class RegexToggleCommand(PlusCommand):
     async def execute(self, args: CommandArgs) -> Tuple[bool, Optional[str], bool]:
         """执行切换状态命令"""
         try:
-            # 直接使用ConfigManager加载配置
-            config_manager = ConfigManager("regex_filter_plugin", "config.toml")
-            config = config_manager.load_config()
-            
-            current_status = config.get("plugin", {}).get("enabled", True)
+            # 当前状态直接取自已编译的规则集
+            config_manager = _CONFIG_MANAGER
+            current_status = config_manager.load_ruleset().enabled
             new_status = not current_status
             
             # 实现真正的状态切换
@@ -664,7 +1825,7 @@ class RegexToggleCommand(PlusCommand):
 
     async def _toggle_plugin_status(self, new_status: bool) -> bool:
         """切换插件启用状态"""
-        config_manager = ConfigManager("regex_filter_plugin", "config.toml")
+        config_manager = _CONFIG_MANAGER
         config = config_manager.load_config()
         
         # 确保plugin节存在
@@ -703,30 +1864,32 @@ class RegexTestCommand(PlusCommand):
             test_text = args.get_raw()
             original_text = test_text
 
-            # 直接使用ConfigManager加载配置并模拟应用规则
-            config_manager = ConfigManager("regex_filter_plugin", "config.toml")
-            config = config_manager.load_config()
-            
-            replace_rules = config.get("rules", {}).get("replace_rules", [])
-            for rule in replace_rules:
-                if not rule.get("enabled", True):
-                    continue
-                pattern = rule.get("pattern", "")
-                replacement = rule.get("replacement", "")
+            # 直接使用消息处理时的已编译规则集模拟应用规则，禁用的规则已在编译时剔除
+            config_manager = _CONFIG_MANAGER
+            ruleset = config_manager.load_ruleset()
+
+            # 用 subn 的替换次数记录实际生效的规则，未命中时不替换字符串；
+            # 合并执行的规则再用等价表达式在替换前的文本上找出具体命中了哪几条
+            matched_rules = []
+            replace_entries = zip(ruleset.replace, ruleset.replace_sources, ruleset.replace_explain)
+            for (matcher, replacement, _), sources, explain in replace_entries:
                 try:
-                    test_text = re.sub(pattern, replacement, test_text)
-                except re.error:
+                    new_text, count = matcher.subn(replacement, test_text)
+                except (re.error, IndexError, TimeoutError):
                     continue
+                if count:
+                    matched_rules.extend(f"替换#{index + 1}" for index in _matched_sources(explain, sources, test_text))
+                    test_text = new_text
 
-            delete_rules = config.get("rules", {}).get("delete_rules", [])
-            for rule in delete_rules:
-                if not rule.get("enabled", True):
-                    continue
-                pattern = rule.get("pattern", "")
+            delete_entries = zip(ruleset.delete, ruleset.delete_sources, ruleset.delete_explain)
+            for (matcher, _), sources, explain in delete_entries:
                 try:
-                    test_text = re.sub(pattern, "", test_text)
-                except re.error:
+                    new_text, count = matcher.subn("", test_text)
+                except TimeoutError:
                     continue
+                if count:
+                    matched_rules.extend(f"删除#{index + 1}" for index in _matched_sources(explain, sources, test_text))
+                    test_text = new_text
 
             result_message = (
                 f"🧪 正则规则测试结果:\n\n"
@@ -734,6 +1897,12 @@ class RegexTestCommand(PlusCommand):
                 f"处理后:\n{test_text}\n\n"
                 f"{'✅ 文本已被修改' if test_text != original_text else '❌ 文本未发生变化'}"
             )
+            if matched_rules:
+                result_message += f"\n命中规则: {', '.join(matched_rules)}"
+            if ruleset.invalid:
+                result_message += "\n\n⚠️ 以下规则的正则表达式无效，已被跳过:\n" + "\n".join(
+                    f"'{pattern}': {error}" for pattern, error in ruleset.invalid
+                )
 
             await self.send_text(result_message)
             return True, "测试规则完成", True
@@ -744,6 +1913,21 @@ class RegexTestCommand(PlusCommand):
             return False, f"测试规则失败: {e}", True
 
 
+@functools.lru_cache(maxsize=None)
+def _component_infos() -> Tuple[Tuple[ComponentInfo, Type], ...]:
+    """生成并缓存插件所有组件的信息，插件重复加载时无需再次生成"""
+    return (
+        # 消息过滤处理器
+        (RegexMessageFilter.get_handler_info(), RegexMessageFilter),
+        # 命令组件
+        (RegexListCommand.get_plus_command_info(), RegexListCommand),
+        (RegexAddCommand.get_plus_command_info(), RegexAddCommand),
+        (RegexRemoveCommand.get_plus_command_info(), RegexRemoveCommand),
+        (RegexToggleCommand.get_plus_command_info(), RegexToggleCommand),
+        (RegexTestCommand.get_plus_command_info(), RegexTestCommand),
+    )
+
+
 @register_plugin
 class RegexFilterPlugin(BasePlugin):
     """RegexFilter正则过滤插件"""
@@ -803,6 +1987,28 @@ class RegexFilterPlugin(BasePlugin):
         },
         "advanced": {
             "max_content_length": ConfigField(int, default=10000, description="最大处理内容长度"),
+            "truncation_mode": ConfigField(
+                str,
+                default="head",
+                choices=["head", "skip"],
+                description="内容超过最大长度时的处理方式: head 只处理前 max_content_length 个字符 / skip 跳过整条消息",
+            ),
+            "regex_engine": ConfigField(
+                str,
+                default="auto",
+                choices=["auto", "re"],
+                description="正则引擎: auto 安装了google-re2时对兼容的规则使用RE2 / re 始终使用Python re",
+            ),
+            "regex_timeout": ConfigField(
+                float,
+                default=0.0,
+                description="单条规则的匹配超时（秒），需安装regex模块，仅对不使用RE2的规则生效，0 表示不限制",
+            ),
+            "merge_delete_rules": ConfigField(
+                bool,
+                default=False,
+                description="是否把相邻的删除规则合并为一次扫描（更快，但删除后拼接出的内容不会再被后面的规则匹配）",
+            ),
             "log_changes": ConfigField(bool, default=False, description="是否记录更改日志"),
         },
     }
@@ -818,14 +2024,14 @@ class RegexFilterPlugin(BasePlugin):
         components = []
 
         if self.get_config("plugin.enabled", True):
-            # 添加消息过滤处理器
-            components.append((RegexMessageFilter.get_handler_info(), RegexMessageFilter))
-            
-            # 添加命令组件
-            components.append((RegexListCommand.get_plus_command_info(), RegexListCommand))
-            components.append((RegexAddCommand.get_plus_command_info(), RegexAddCommand))
-            components.append((RegexRemoveCommand.get_plus_command_info(), RegexRemoveCommand))
-            components.append((RegexToggleCommand.get_plus_command_info(), RegexToggleCommand))
-            components.append((RegexTestCommand.get_plus_command_info(), RegexTestCommand))
+            # 插件加载时在后台预编译规则集，既不阻塞加载，第一条消息通常也无需等待编译
+            _CONFIG_MANAGER.warm_up()
+
+            # 消息过滤处理器和命令组件的信息只需生成一次
+            components.extend(_component_infos())
 
         return components
+
+
+# 标量配置项的类型、默认值和可选值，模块加载时从 config_schema 展开一次
+_SCHEMA_FIELDS = _flatten_schema(RegexFilterPlugin.config_schema)
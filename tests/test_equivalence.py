@@ -0,0 +1,151 @@
+"""消息处理结果与逐条执行 re.sub 的等价性测试
+
+合并替换、合并删除、RE2 和 Aho-Corasick 都是对逐条执行规则的优化，结果必须与直接用 re 依次执行一致。
+需要在 MaiBot 环境中运行（插件依赖 src.plugin_system）。
+"""
+
+import random
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("src.plugin_system")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import plugin  # noqa: E402
+
+# 规则测试的文本不含空白字符，结果不受最终空白清理影响，可以直接与 re.sub 的结果比较
+ALPHABET = "abcdxyz0好啊！!"
+
+REPLACE_PATTERNS = [
+    "b+c", "a+b", "x+", "a+", r"\b", "[ab]+", "c[0-9]", "[xy]{2}", "d+", "(?:ab|cd)",
+    "y?z", "[a-c]", "好+", "[^a]", ".b", "a|b", "(?i:a)+", "(?i)abc", "c?|a",
+]
+REPLACEMENTS = ["X", "Y", "", "a", "b", "ab", "z", "好"]
+DELETE_PATTERNS = [
+    "ab", "abc", "b", "[xy]", "c+d", "好", "a", "bc", "x[0-9]+", "(ab|cd)y", "z",
+    "[!！]*", "啊", "b+", "a[c]", "c?|a", "(?i)ab",
+]
+
+
+def _handler():
+    # _process_sync 只依赖规则集和空白清理，不需要事件处理器的初始化参数
+    return plugin.RegexMessageFilter.__new__(plugin.RegexMessageFilter)
+
+
+def _random_text(rng, alphabet=ALPHABET, length=12):
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, length)))
+
+
+def _random_rules(rng, patterns, count, **fields):
+    rules = []
+    for _ in range(rng.randint(1, count)):
+        rule = {"pattern": rng.choice(patterns), "ignore_case": rng.random() < 0.2}
+        rule.update({key: rng.choice(values) for key, values in fields.items()})
+        rules.append(rule)
+    return rules
+
+
+def _sequential(text, rules, replacement_key=None):
+    for rule in rules:
+        flags = re.IGNORECASE if rule["ignore_case"] else 0
+        replacement = rule[replacement_key] if replacement_key else ""
+        text = re.sub(rule["pattern"], replacement, text, flags=flags)
+    return text
+
+
+def _reference_clean(content):
+    """原始的逐步空白清理实现"""
+    if not content:
+        return content
+    content = content.strip()
+    content = re.sub(r'\n\s*\n\s*', '\n\n', content)
+    content = re.sub(r'[ \t]+', ' ', content)
+    content = re.sub(r'\n[ \t]+', '\n', content)
+    content = re.sub(r'[ \t]+\n', '\n', content)
+    return content.strip()
+
+
+@pytest.mark.parametrize("engine", ["auto", "re"])
+def test_replace_rules_match_sequential_sub(engine):
+    rng = random.Random(1)
+    handler = _handler()
+    for _ in range(3000):
+        rules = _random_rules(rng, REPLACE_PATTERNS, 4, replacement=REPLACEMENTS)
+        ruleset = plugin.CompiledRuleset.from_config(
+            {"advanced": {"regex_engine": engine}, "rules": {"replace_rules": rules}}
+        )
+        text = _random_text(rng)
+        assert handler._process_sync(text, ruleset)[0] == _sequential(text, rules, "replacement"), (rules, text)
+
+
+@pytest.mark.parametrize("engine", ["auto", "re"])
+def test_delete_rules_match_sequential_sub(engine):
+    rng = random.Random(2)
+    handler = _handler()
+    for _ in range(3000):
+        rules = _random_rules(rng, DELETE_PATTERNS, 5)
+        ruleset = plugin.CompiledRuleset.from_config(
+            {"advanced": {"regex_engine": engine}, "rules": {"delete_rules": rules}}
+        )
+        text = _random_text(rng)
+        assert handler._process_sync(text, ruleset)[0] == _sequential(text, rules), (rules, text)
+
+
+def _assert_merged_deletes_match_explain(ruleset, text):
+    """合并后的删除项（前缀树、Aho-Corasick、RE2）与用 re 执行的等价表达式结果一致"""
+    for (matcher, _), explain in zip(ruleset.delete, ruleset.delete_explain):
+        if explain is None:
+            continue
+        pattern, flags, _ = explain
+        assert matcher.subn("", text) == plugin._compile(pattern, flags).subn("", text), (pattern, text)
+
+
+def test_merged_delete_batches_match_single_scan():
+    rng = random.Random(3)
+    for _ in range(3000):
+        rules = _random_rules(rng, DELETE_PATTERNS, 5)
+        ruleset = plugin.CompiledRuleset.from_config(
+            {"advanced": {"merge_delete_rules": True}, "rules": {"delete_rules": rules}}
+        )
+        _assert_merged_deletes_match_explain(ruleset, _random_text(rng))
+
+
+def test_re2_matchers_match_re():
+    if plugin._load_re2() is None:
+        pytest.skip("google-re2 未安装")
+    rng = random.Random(4)
+    patterns = REPLACE_PATTERNS + DELETE_PATTERNS + ["(?m)^", "(?m)$", "(?m)^a?", "(?m)a$", "^", r"\A", "x*"]
+    alphabet = ALPHABET + "\n"
+    for pattern in patterns:
+        for flags in (0, re.IGNORECASE, re.MULTILINE):
+            matcher = plugin._compile_matcher(pattern, flags, True)
+            expected = plugin._compile(pattern, flags)
+            for _ in range(200):
+                text = _random_text(rng, alphabet)
+                assert matcher.subn("X", text) == expected.subn("X", text), (pattern, flags, text)
+
+
+def test_aho_corasick_matches_single_scan():
+    if plugin._load_ahocorasick() is None:
+        pytest.skip("pyahocorasick 未安装")
+    rng = random.Random(5)
+    words = sorted({"".join(rng.choice("abcd好") for _ in range(rng.randint(1, 5))) for _ in range(600)})
+    assert len(words) >= plugin._AHOCORASICK_MIN_WORDS
+    rules = [{"pattern": word} for word in words]
+    ruleset = plugin.CompiledRuleset.from_config(
+        {"advanced": {"merge_delete_rules": True}, "rules": {"delete_rules": rules}}
+    )
+    assert isinstance(ruleset.delete[0][0], plugin._AhoCorasickMatcher)
+    for _ in range(1000):
+        _assert_merged_deletes_match_explain(ruleset, _random_text(rng, "abcd好x", 30))
+
+
+def test_whitespace_cleanup_matches_reference():
+    rng = random.Random(6)
+    handler = _handler()
+    for _ in range(5000):
+        text = _random_text(rng, "ab \t\n\r", 16)
+        assert handler._clean_extra_whitespace(text) == _reference_clean(text), repr(text)